@@ -1,13 +1,29 @@
 # chains.py
+import asyncio
+import atexit
+import copy
+import functools
+import hashlib
+import itertools
+import json
 import os
+import random
+import re
+import threading
 import time
-from typing import Any, List
+from collections import OrderedDict, deque
+from typing import Any, Iterator, List
 
+import httpx
 from dotenv import load_dotenv
+from groq import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.output_parsers import JsonOutputParser, PydanticOutputParser
 from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import RunnableLambda
+from langchain_core.globals import set_llm_cache
 from langchain_groq import ChatGroq
+from pydantic import BaseModel, field_validator
 
 # Gemini is optional; handle if the package isn't installed
 try:
@@ -17,18 +33,147 @@ except Exception:
     ChatGoogleGenerativeAI = None  # type: ignore
     _HAS_GEMINI = False
 
+# Chroma is optional; its built-in MiniLM embedder backs the semantic email cache
+try:
+    import chromadb  # type: ignore
+    _HAS_CHROMA = True
+except Exception:
+    chromadb = None  # type: ignore
+    _HAS_CHROMA = False
+
+# Jinja is optional; used to render learned email templates (sandboxed: templates come from the LLM)
+try:
+    from jinja2.sandbox import SandboxedEnvironment  # type: ignore
+    _HAS_JINJA = True
+except Exception:
+    SandboxedEnvironment = None  # type: ignore
+    _HAS_JINJA = False
+
+# tiktoken is optional (its BPE file is fetched on first use); fall back to ~4 chars/token
+try:
+    import tiktoken  # type: ignore
+except Exception:
+    tiktoken = None  # type: ignore
+
+# HTTP/2 needs the optional h2 package (httpx[http2])
+try:
+    import h2  # type: ignore  # noqa: F401
+    _HAS_HTTP2 = True
+except Exception:
+    _HAS_HTTP2 = False
+
 # Optional Streamlit (for secrets in cloud)
 try:
     import streamlit as st  # type: ignore
 except Exception:
     st = None  # type: ignore
 
+# Persistent exact-match LLM cache (survives restarts) if langchain-community is available
+try:
+    from langchain_community.cache import SQLiteCache
+except Exception:
+    SQLiteCache = None  # type: ignore
+
 load_dotenv()
 
 
+def enable_llm_cache(path: str | None = None) -> bool:
+    """
+    Opt in to LangChain's process-global SQLite cache of LLM responses (survives restarts).
+    ``path`` defaults to $LLM_CACHE_PATH, else ``.groq_cache.sqlite``; False if the package is missing.
+    """
+    if SQLiteCache is None:
+        return False
+    set_llm_cache(SQLiteCache(database_path=path or os.getenv("LLM_CACHE_PATH", ".groq_cache.sqlite")))
+    return True
+
+
+# --------------------- Extraction schema ---------------------
+class Job(BaseModel):
+    role: str = ""
+    experience: str = ""
+    skills: List[str] = []
+    description: str = ""
+
+    @field_validator("role", "experience", "description", mode="before")
+    @classmethod
+    def _as_text(cls, v):
+        if v is None:
+            return ""
+        return ", ".join(map(str, v)) if isinstance(v, list) else str(v)
+
+    @field_validator("skills", mode="before")
+    @classmethod
+    def _as_list(cls, v):
+        if v is None:
+            return []
+        if isinstance(v, str):
+            return [s.strip() for s in v.split(",") if s.strip()]
+        return [str(s) for s in v]
+
+
+class JobList(BaseModel):
+    jobs: List[Job]
+
+
+_JOB_PARSER = PydanticOutputParser(pydantic_object=JobList)
+
+
+# --------------------- Prompts ---------------------
+# Compiled once at import. Static instructions come first and per-request data last,
+# keeping a long shared prefix for provider-side prompt caching.
+_PROMPT_EXTRACT = PromptTemplate.from_template(
+    """### INSTRUCTION:
+The scraped text below is from a careers page.
+Extract job postings with keys: role, experience, skills, description.
+{format_instructions}
+Return ONLY JSON (no extra text).
+
+### SCRAPED TEXT FROM WEBSITE:
+{page_data}""",
+    partial_variables={"format_instructions": _JOB_PARSER.get_format_instructions()},
+)
+
+_PROMPT_EMAIL = PromptTemplate.from_template(
+    """### INSTRUCTION:
+You are Mohan, BDE at AtliQ (AI & Software Consulting).
+Write a SHORT, well-structured PLAIN TEXT cold email (no markdown, no hashtags, no asterisks).
+Include:
+- Subject line (single concise line starting with "Subject:")
+- Greeting
+- One-paragraph intro about AtliQ and why we’re relevant to this job
+- A specific value proposition referencing the role/requirements
+- The most relevant links from PORTFOLIO LINKS below, pasted as plain URLs (skip if none)
+- A clear call to action to schedule a quick call
+- Polite sign-off with name and title
+
+Return ONLY clean plain text.
+
+### PORTFOLIO LINKS:
+{link_list}
+
+### JOB DESCRIPTION:
+{job_description}"""
+)
+
+_PROMPT_TEMPLATE = PromptTemplate.from_template(
+    """### INSTRUCTION:
+The cold emails below were written for different postings of the same role.
+Generalise them into ONE reusable Jinja2 template in the same plain-text style.
+Use {{{{ role }}}} for the job title, {{{{ skills }}}} for the comma-separated skills
+and {{{{ links }}}} for the portfolio links. Everything else must be fixed text.
+The first line must start with "Subject:".
+Return ONLY the template.
+
+### EMAILS:
+{examples}"""
+)
+
+
 # --------------------- Secrets helpers ---------------------
+@functools.lru_cache(maxsize=None)
 def _get_secret(name: str) -> str | None:
-    """Read from Streamlit secrets if present, else OS env."""
+    """Read from Streamlit secrets if present, else OS env (memoised: secrets are fixed per process)."""
     val = None
     if st and hasattr(st, "secrets"):
         try:
@@ -39,9 +184,27 @@ def _get_secret(name: str) -> str | None:
 
 
 # --------------------- LLM builders ---------------------
+REQUEST_TIMEOUT_SEC = 120
+
+# One pooled client for every ChatGroq instance: TLS handshakes are paid once per host and
+# connections stay alive across fallback attempts, keys and models.
+_HTTPX = httpx.Client(
+    http2=_HAS_HTTP2,
+    timeout=REQUEST_TIMEOUT_SEC,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+)
+atexit.register(_HTTPX.close)
+
+
 def _make_groq_llm(api_key: str, model_name: str, temperature: float = 0.0):
     """Create Groq LLM (supports old/new arg names)."""
-    kwargs = dict(model_name=model_name, temperature=temperature)
+    kwargs = dict(
+        model_name=model_name,
+        temperature=temperature,
+        request_timeout=REQUEST_TIMEOUT_SEC,
+        http_client=_HTTPX,
+        max_retries=0,  # _invoke_with_retry is the only retry layer (the SDK would retry 429/5xx itself)
+    )
     try:
         return ChatGroq(api_key=api_key, **kwargs)
     except TypeError:
@@ -55,36 +218,360 @@ def _make_gemini_llm(api_key: str, model_name: str = "gemini-1.5-flash", tempera
     return ChatGoogleGenerativeAI(model=model_name, google_api_key=api_key, temperature=temperature)
 
 
+# --------------------- Prompt input / output budget ---------------------
+MAX_PAGE_TOKENS = 6000      # scraped page is clipped to this before extraction
+EXTRACT_MAX_TOKENS = 2048   # JSON for a careers page with several postings
+EMAIL_MAX_TOKENS = 600      # a short cold email is well under this
+ROUTE_TOKEN_THRESHOLD = 2000  # inputs up to this go to the 8B model first, larger ones to 70B
+GROQ_RPM = 30     # free-tier requests per minute, per key
+GROQ_TPM = 7000   # free-tier tokens per minute, per key (70B)
+
+_MARKUP_RESIDUE_RE = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def _count_tokens(text: str) -> int:
+    enc = _encoding()
+    return len(enc.encode(text)) if enc is not None else len(text) // 4
+
+
+def _prune(text: str, max_tokens: int = MAX_PAGE_TOKENS) -> str:
+    """Drop markup residue, squeeze whitespace, dedupe repeated lines and clip to ``max_tokens``."""
+    text = _MARKUP_RESIDUE_RE.sub(" ", text)
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    text = "\n".join(line for line, _ in itertools.groupby(l for l in lines if l))
+    enc = _encoding()
+    if enc is None:
+        return text[: max_tokens * 4]
+    tokens = enc.encode(text)
+    return text if len(tokens) <= max_tokens else enc.decode(tokens[:max_tokens])
+
+
+def _cap_output(route_key: tuple, llm, max_tokens: int):
+    """Bind an output-token cap on Groq models (Gemini takes a different kwarg; left uncapped)."""
+    return llm.bind(max_tokens=max_tokens) if route_key[0] == "groq" else llm
+
+
+def _request_tokens(runnable, payload: dict) -> int:
+    """TPM cost of one Groq call: the rendered prompt plus the ``max_tokens`` it reserves for output."""
+    runnable = getattr(runnable, "runnable", runnable)  # _MicroBatcher wraps the prompt | llm chain
+    prompt = runnable.first.format(**payload)
+    return _count_tokens(prompt) + getattr(runnable.last, "kwargs", {}).get("max_tokens", 0)
+
+
 # --------------------- Retry wrapper ---------------------
-def _invoke_with_retry(chain, payload, retries: int = 1, backoff_sec: float = 3.0):
-    last_err = None
-    for _ in range(retries + 1):
+_RETRYABLE_STATUS = {429, 500, 502, 503, 529}
+_TRANSIENT_ERRORS = (
+    RateLimitError, APITimeoutError, APIConnectionError,
+    httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError,
+)
+_RETRY_AFTER_RE = re.compile(r"try again in ([\d.]+)s", re.IGNORECASE)
+KEY_COOLDOWN_SEC = 20.0  # cool-down for a rate-limited key when the server gives no hint
+
+
+def _status_code(err: Exception) -> int | None:
+    """HTTP status of an SDK error (groq ``status_code``; google.api_core ``code``)."""
+    code = err.status_code if isinstance(err, APIStatusError) else getattr(err, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def _is_rate_limit(err: Exception) -> bool:
+    return isinstance(err, RateLimitError) or _status_code(err) == 429
+
+
+def _is_retryable(err: Exception) -> bool:
+    return isinstance(err, _TRANSIENT_ERRORS) or _status_code(err) in _RETRYABLE_STATUS
+
+
+def _retry_after(err: Exception) -> float | None:
+    """Server-suggested wait (seconds) from a Retry-After header or Groq's "try again in Xs" hint."""
+    response = getattr(err, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        pass
+    m = _RETRY_AFTER_RE.search(str(err))
+    return float(m.group(1)) if m else None
+
+
+def _retry_delay(err: Exception, attempt: int, max_retries: int, max_delay: float, fail_fast_on_rate_limit: bool) -> float | None:
+    """Seconds to wait before the next attempt, or None if ``err`` should propagate."""
+    if not _is_retryable(err) or attempt == max_retries - 1:
+        return None
+    if fail_fast_on_rate_limit and _is_rate_limit(err):
+        return None
+    hint = _retry_after(err)
+    if hint is None:
+        return min(max_delay, random.uniform(2, 4) * (attempt + 1))
+    if hint > max_delay:
+        return None  # don't park the Streamlit worker; let the caller fail over to the next provider
+    return hint + random.uniform(0.05, 0.2)
+
+
+def _invoke_with_retry(chain, payload, max_retries: int = 5, max_delay: float = 60.0, fail_fast_on_rate_limit: bool = False):
+    """
+    Invoke with retries on transient errors (rate limits, 5xx, timeouts).
+    Sleeps for the server's Retry-After hint when given, else exponential backoff with jitter.
+    ``fail_fast_on_rate_limit`` re-raises 429s at once so the caller can switch API key.
+    """
+    for attempt in range(max_retries):
         try:
             return chain.invoke(payload)
         except Exception as e:
-            msg = str(e).lower()
-            last_err = e
-            if any(k in msg for k in ("429", "rate limit", "quota", "exceeded", "temporarily")):
-                time.sleep(backoff_sec)
+            delay = _retry_delay(e, attempt, max_retries, max_delay, fail_fast_on_rate_limit)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+
+async def _ainvoke_with_retry(chain, payload, max_retries: int = 5, max_delay: float = 60.0, fail_fast_on_rate_limit: bool = False):
+    """Async twin of _invoke_with_retry: ``ainvoke`` + ``asyncio.sleep`` so waits don't block the loop."""
+    for attempt in range(max_retries):
+        try:
+            return await chain.ainvoke(payload)
+        except Exception as e:
+            delay = _retry_delay(e, attempt, max_retries, max_delay, fail_fast_on_rate_limit)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+
+
+def _stream_with_retry(chain, payload, max_retries: int = 5, max_delay: float = 60.0, fail_fast_on_rate_limit: bool = False):
+    """Streaming twin of _invoke_with_retry: a stream is only retried if it failed before its first chunk."""
+    for attempt in range(max_retries):
+        started = False
+        try:
+            for chunk in chain.stream(payload):
+                started = True
+                yield chunk
+            return
+        except Exception as e:
+            delay = None if started else _retry_delay(e, attempt, max_retries, max_delay, fail_fast_on_rate_limit)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+
+# --------------------- API key pool ---------------------
+class _KeyPool:
+    """Least-used routing over several API keys for one model; rate-limited keys cool down."""
+
+    def __init__(self, keys: List[str]):
+        self.keys = list(dict.fromkeys(keys))
+        self._stats = {k: [0, 0.0] for k in self.keys}  # key -> [requests, last used ts]
+        self._cooling: dict[str, float] = {}             # key -> usable again at (monotonic)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def acquire(self, exclude=()) -> str | None:
+        """Pick the least-used, least-recently-used key that is not cooling or excluded."""
+        now = time.monotonic()
+        with self._lock:
+            ready = [k for k in self.keys if k not in exclude and self._cooling.get(k, 0) <= now]
+            if not ready:
+                return None
+            key = min(ready, key=lambda k: tuple(self._stats[k]))
+            self._stats[key][0] += 1
+            self._stats[key][1] = now
+            return key
+
+    def cool(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._cooling[key] = time.monotonic() + seconds
+
+
+class _RateBudget:
+    """
+    Thread-safe leaky bucket of ``rate`` units per ``period`` seconds, shared by the sync and
+    async paths (an aiolimiter bucket can only be awaited, not waited on from a plain thread).
+    """
+
+    def __init__(self, rate: float, period: float = 60.0):
+        self.rate = rate
+        self.period = period
+        self._level = 0.0
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        """Book ``amount`` units now; return the seconds to wait before spending them."""
+        amount = min(amount, self.rate)
+        with self._lock:
+            now = time.monotonic()
+            drained = (now - self._ts) * self.rate / self.period
+            self._level = max(0.0, self._level - drained) + amount
+            self._ts = now
+            return max(0.0, (self._level - self.rate) * self.period / self.rate)
+
+
+# --------------------- Response cache ---------------------
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _job_digest(job: dict) -> str:
+    """Stable key for a job + prefs dict: independent of key order, cheaper than sha256."""
+    blob = json.dumps(job, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+
+class _ResponseCache:
+    """Thread-safe in-process LRU for parsed LLM responses."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return copy.deepcopy(self._data[key])
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = copy.deepcopy(value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+SEMANTIC_MAX_DISTANCE = 0.07  # cosine distance, i.e. similarity >= 0.93
+SEMANTIC_MAX_ENTRIES = 256     # FIFO bound on the in-memory collection
+SEMANTIC_DOC_CHARS = 4000      # embed only the head of long job descriptions
+
+
+def _swap_links(email: str, old: List[str], new: List[str]) -> str:
+    """Point a reused email at the new job's portfolio links (positional swap)."""
+    if not old:
+        return email
+    mapping = dict(zip(old, new))
+    pattern = re.compile("|".join(re.escape(u) for u in sorted(mapping, key=len, reverse=True)))
+    return pattern.sub(lambda m: mapping[m.group(0)], email)
+
+
+GENCACHE_MIN_SAMPLES = 3  # emails per role cluster before a reusable template is learned
+_SENIORITY_RE = re.compile(r"\b(senior|junior|sr|jr|lead|principal|staff|intern|i{1,3}|iv|[0-9]+)\b")
+
+
+def _role_cluster(job: dict) -> tuple[str, str, str]:
+    """Cluster id for templated reuse: normalised role (seniority stripped) + tone + cta."""
+    role = re.sub(r"[^a-z0-9]+", " ", str(job.get("role", "")).lower())
+    role = " ".join(_SENIORITY_RE.sub(" ", role).split())
+    return role, str(job.get("tone", "")), str(job.get("cta", ""))
+
+
+def _template_context(job: dict, links: List[str]) -> dict[str, str]:
+    skills = job.get("skills", [])
+    if isinstance(skills, list):
+        skills = ", ".join(str(x).strip() for x in skills if str(x).strip())
+    return {"role": str(job.get("role", "")), "skills": str(skills), "links": "\n".join(links)}
+
+
+# --------------------- Micro-batching ---------------------
+class _Pending:
+    __slots__ = ("payload", "done", "result", "error")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.done = threading.Event()
+        self.result = None
+        self.error: Exception | None = None
+
+
+class _MicroBatcher:
+    """
+    Drop-in ``invoke`` that coalesces concurrent callers (e.g. several Streamlit sessions)
+    into one ``runnable.batch`` call: flushes after ``max_wait_ms`` or ``max_batch`` items.
+    """
+
+    def __init__(self, runnable, max_batch: int = 16, max_wait_ms: float = 20):
+        self.runnable = runnable
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: deque[_Pending] = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()  # queue is non-empty
+        self._full = threading.Event()    # queue holds a full batch; flush without waiting
+        self._worker: threading.Thread | None = None
+
+    def invoke(self, payload):
+        item = _Pending(payload)
+        with self._lock:
+            self._queue.append(item)
+            if len(self._queue) >= self.max_batch:
+                self._full.set()
+            self._wakeup.set()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="llm-microbatch", daemon=True)
+                self._worker.start()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._full.wait(self.max_wait)
+            with self._lock:
+                items = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+                if len(self._queue) < self.max_batch:
+                    self._full.clear()
+                if not self._queue:
+                    self._wakeup.clear()
+            if not items:
                 continue
-            raise
-    raise last_err
+            try:
+                outs = self.runnable.batch([it.payload for it in items], return_exceptions=True)
+            except Exception as e:
+                outs = [e] * len(items)
+            for it, out in zip(items, outs):
+                if isinstance(out, Exception):
+                    it.error = out
+                else:
+                    it.result = out
+                it.done.set()
 
 
 # --------------------- Main chain ---------------------
 class Chain:
     """
-    - extract_jobs → Groq 8B → Groq 70B → Gemini (if key + package are available)
-    - write_mail  → Groq 70B → Groq 8B → Gemini
+    - Inputs ≤ ROUTE_TOKEN_THRESHOLD tokens → Groq 8B → Groq 70B → Gemini (if key + package are available)
+    - Larger inputs                         → Groq 70B → Groq 8B → Gemini
     Secrets supported:
-      GROQ_API_KEY (base), GROQ_API_KEY_FAST, GROQ_API_KEY_HEAVY, GEMINI_API_KEY
+      GROQ_API_KEY (base), GROQ_API_KEY_FAST, GROQ_API_KEY_HEAVY, GEMINI_API_KEY,
+      GROQ_API_KEYS (comma-separated; Groq calls are spread over the least-used key)
+    Concurrent extract_jobs calls are micro-batched (``max_batch`` items / ``max_wait_ms`` window).
     """
 
-    def __init__(self):
+    def __init__(self, max_batch: int = 16, max_wait_ms: float = 20):
         base_key = _get_secret("GROQ_API_KEY")
         self.fast_key = _get_secret("GROQ_API_KEY_FAST") or base_key
         self.heavy_key = _get_secret("GROQ_API_KEY_HEAVY") or base_key
         self.gemini_key = _get_secret("GEMINI_API_KEY")
+        groq_keys = [k.strip() for k in (_get_secret("GROQ_API_KEYS") or "").split(",") if k.strip()]
+        if groq_keys:
+            self.fast_key = self.fast_key or groq_keys[0]
+            self.heavy_key = self.heavy_key or groq_keys[0]
 
         if not (self.fast_key or self.heavy_key or self.gemini_key):
             raise ValueError("❌ No API key found. Add GROQ_API_KEY or GEMINI_API_KEY in secrets or .env")
@@ -93,80 +580,483 @@ class Chain:
         self.heavy_model = "llama-3.3-70b-versatile"
         self.gemini_model = "gemini-1.5-flash"
         self._json_parser = JsonOutputParser()
+        self._parser = _JOB_PARSER
+
+        # Routes are (provider, model); each has a key pool. Every LLM client and
+        # prompt→LLM runnable is built once per (provider, model, key) and reused.
+        fast = ("groq", self.fast_model)
+        heavy = ("groq", self.heavy_model)
+        gemini = ("gemini", self.gemini_model)
+        self._pools: dict[tuple[str, str], _KeyPool] = {}
+        if self.fast_key:
+            self._pools[fast] = _KeyPool(groq_keys or [self.fast_key])
+        if self.heavy_key:
+            self._pools[heavy] = _KeyPool(groq_keys or [self.heavy_key])
+        if self.gemini_key and _HAS_GEMINI:
+            self._pools[gemini] = _KeyPool([self.gemini_key])
+        self._small_routes = [r for r in (fast, heavy, gemini) if r in self._pools]
+        self._large_routes = [r for r in (heavy, fast, gemini) if r in self._pools]
+
+        self._llms = {}
+        for (provider, model), pool in self._pools.items():
+            make = _make_groq_llm if provider == "groq" else _make_gemini_llm
+            for api_key in pool.keys:
+                self._llms[(provider, model, api_key)] = make(api_key, model)
+        self._extract_chains = {
+            k: _PROMPT_EXTRACT | _cap_output(k, llm, EXTRACT_MAX_TOKENS) for k, llm in self._llms.items()
+        }
+        self._email_chains = {
+            k: _PROMPT_EMAIL | _cap_output(k, llm, EMAIL_MAX_TOKENS) for k, llm in self._llms.items()
+        }
+        self._template_chains = {
+            k: _PROMPT_TEMPLATE | _cap_output(k, llm, EMAIL_MAX_TOKENS) for k, llm in self._llms.items()
+        }
+        self._extract_batchers = {
+            k: _MicroBatcher(c, max_batch, max_wait_ms) for k, c in self._extract_chains.items()
+        }
+        # Calls wait for budget instead of tripping 429s (request + token buckets per Groq key)
+        self._limiters: dict[str, tuple[_RateBudget, _RateBudget]] = {}
+        for (provider, _), pool in self._pools.items():
+            if provider == "groq":
+                for api_key in pool.keys:
+                    self._limiters.setdefault(api_key, (_RateBudget(GROQ_RPM), _RateBudget(GROQ_TPM)))
+        self._extract_cache = _ResponseCache()
+        self._email_cache = _ResponseCache()
+        self._sem_cache = None
+        if _HAS_CHROMA:
+            try:
+                self._sem_cache = chromadb.Client().get_or_create_collection(
+                    "emails", metadata={"hnsw:space": "cosine"}
+                )
+            except Exception:
+                self._sem_cache = None
+        self._sem_ids: deque[str] = deque()
+        self._sem_lock = threading.Lock()
+        self._reuse_stats = {"semantic": [0, 0], "gencache": [0, 0]}  # name -> [hits, misses]
+        # GenCache: role cluster -> learned template (None once learning failed) + pending samples
+        self._gencache: dict[tuple, Any] = {}
+        self._gencache_samples: dict[tuple, list[str]] = {}
+        self._gencache_lock = threading.Lock()
+        self._jinja = SandboxedEnvironment(autoescape=False) if _HAS_JINJA else None
 
     # -------- extract --------
     def extract_jobs(self, cleaned_text: str) -> List[dict[str, Any]]:
-        prompt_extract = PromptTemplate.from_template(
-            """### SCRAPED TEXT FROM WEBSITE:
-{page_data}
-
-### INSTRUCTION:
-The scraped text is from a careers page.
-Extract job postings and return valid JSON with keys: role, experience, skills, description.
-Return ONLY JSON (no extra text)."""
+        key = _sha256(cleaned_text)
+        cached = self._extract_cache.get(key)
+        if cached is not None:
+            return cached
+
+        page_data = _prune(cleaned_text)
+        jobs = self._run_with_fallback(
+            self._extract_batchers, self._routes_by_size(page_data), {"page_data": page_data}, self._parse_jobs
         )
+        self._extract_cache.put(key, jobs)
+        return jobs
 
-        attempts: list[tuple[str, str, str]] = []
-        if self.fast_key:
-            attempts.append(("groq", self.fast_key, self.fast_model))
-        if self.heavy_key:
-            attempts.append(("groq", self.heavy_key, self.heavy_model))
-        if self.gemini_key and _HAS_GEMINI:
-            attempts.append(("gemini", self.gemini_key, self.gemini_model))
+    async def aextract_jobs(self, cleaned_text: str) -> List[dict[str, Any]]:
+        key = _sha256(cleaned_text)
+        cached = self._extract_cache.get(key)
+        if cached is not None:
+            return cached
 
+        page_data = _prune(cleaned_text)
+        jobs = await self._arun_with_fallback(
+            self._extract_chains, self._routes_by_size(page_data), {"page_data": page_data}, self._parse_jobs
+        )
+        self._extract_cache.put(key, jobs)
+        return jobs
+
+    # -------- provider fallback --------
+    def _run_with_fallback(self, runnables: dict, routes: list, payload: dict, parse=lambda res: res):
+        """Try each route (with key rotation + retries) until one returns something ``parse`` accepts."""
         last_error = None
-        for provider, api_key, model in attempts:
+        for route in routes:
             try:
-                llm = _make_groq_llm(api_key, model) if provider == "groq" else _make_gemini_llm(api_key, model)
-                chain_extract = prompt_extract | llm
-                res = _invoke_with_retry(chain_extract, {"page_data": cleaned_text}, retries=1)
-                content = getattr(res, "content", res)
-                parsed = self._json_parser.parse(content)
-                return parsed if isinstance(parsed, list) else [parsed]
+                return parse(self._invoke_route(runnables, route, payload))
             except Exception as e:
                 last_error = e
-                continue
+        raise last_error or RuntimeError("LLM call failed on all providers.")
+
+    async def _arun_with_fallback(self, runnables: dict, routes: list, payload: dict, parse=lambda res: res):
+        """Async twin of _run_with_fallback."""
+        last_error = None
+        for route in routes:
+            try:
+                return parse(await self._ainvoke_route(runnables, route, payload))
+            except Exception as e:
+                last_error = e
+        raise last_error or RuntimeError("LLM call failed on all providers.")
+
+    def _routes_by_size(self, text: str) -> list[tuple[str, str]]:
+        """Skip a doomed 8B round trip on big inputs and the pricey 70B on small ones."""
+        return self._small_routes if _count_tokens(text) <= ROUTE_TOKEN_THRESHOLD else self._large_routes
+
+    def _invoke_route(self, runnables: dict, route: tuple[str, str], payload):
+        """Invoke ``route`` on its least-used key; a rate-limited key cools down and the next one is tried."""
+        pool = self._pools[route]
+        tried: set[str] = set()
+        last_error = None
+        while True:
+            key = pool.acquire(exclude=tried)
+            if key is None:
+                raise last_error or RuntimeError(f"All API keys for {route[1]} are cooling down.")
+            tried.add(key)
+            others_left = len(tried) < len(pool)
+            runnable = runnables[(*route, key)]
+            try:
+                self._throttle(key, runnable, payload)
+                return _invoke_with_retry(runnable, payload, fail_fast_on_rate_limit=others_left)
+            except Exception as e:
+                if not _is_rate_limit(e):
+                    raise
+                pool.cool(key, _retry_after(e) or KEY_COOLDOWN_SEC)
+                last_error = e
 
-        raise last_error or RuntimeError("Extraction failed on all providers.")
+    async def _ainvoke_route(self, runnables: dict, route: tuple[str, str], payload):
+        """Async twin of _invoke_route."""
+        pool = self._pools[route]
+        tried: set[str] = set()
+        last_error = None
+        while True:
+            key = pool.acquire(exclude=tried)
+            if key is None:
+                raise last_error or RuntimeError(f"All API keys for {route[1]} are cooling down.")
+            tried.add(key)
+            others_left = len(tried) < len(pool)
+            runnable = runnables[(*route, key)]
+            try:
+                await self._athrottle(key, runnable, payload)
+                return await _ainvoke_with_retry(runnable, payload, fail_fast_on_rate_limit=others_left)
+            except Exception as e:
+                if not _is_rate_limit(e):
+                    raise
+                pool.cool(key, _retry_after(e) or KEY_COOLDOWN_SEC)
+                last_error = e
+
+    def _parse_jobs(self, res) -> List[dict[str, Any]]:
+        """Schema-validated jobs; tolerates a bare list/object when the model skips the wrapper."""
+        content = getattr(res, "content", res)
+        try:
+            jobs = self._parser.parse(content).jobs
+        except OutputParserException:
+            parsed = self._json_parser.parse(content)
+            if isinstance(parsed, dict) and "jobs" not in parsed:
+                parsed = [parsed]
+            jobs = JobList.model_validate(parsed if isinstance(parsed, dict) else {"jobs": parsed}).jobs
+        return [j.model_dump() for j in jobs]
+
+    # -------- batch extract (several pages per call) --------
+    def extract_jobs_batch(self, texts: List[str], max_concurrency: int = 8) -> List[List[dict[str, Any]]]:
+        """Extract jobs from many pages concurrently; pages that fail move on to the next provider."""
+        pages = [_prune(t) for t in texts]
+        results: list = [None] * len(texts)
+        pending, last_error = list(range(len(texts))), None
+        for route in self._routes_by_size(max(pages, key=len, default="")):
+            if not pending:
+                break
+            outs = self._route_runner(self._extract_chains, route).batch(
+                [{"page_data": pages[i]} for i in pending],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+            pending, last_error = self._absorb_batch(
+                pending, outs, results, last_error, lambda i, res: self._parse_jobs(res)
+            )
+        if pending:
+            raise last_error or RuntimeError("Extraction failed on all providers.")
+        return results
+
+    async def aextract_jobs_batch(self, texts: List[str], max_concurrency: int = 8) -> List[List[dict[str, Any]]]:
+        """Async twin of extract_jobs_batch (e.g. ``asyncio.run(chain.aextract_jobs_batch(texts))``)."""
+        pages = [_prune(t) for t in texts]
+        results: list = [None] * len(texts)
+        pending, last_error = list(range(len(texts))), None
+        for route in self._routes_by_size(max(pages, key=len, default="")):
+            if not pending:
+                break
+            outs = await self._route_runner(self._extract_chains, route).abatch(
+                [{"page_data": pages[i]} for i in pending],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+            pending, last_error = self._absorb_batch(
+                pending, outs, results, last_error, lambda i, res: self._parse_jobs(res)
+            )
+        if pending:
+            raise last_error or RuntimeError("Extraction failed on all providers.")
+        return results
+
+    def _route_runner(self, runnables: dict, route: tuple[str, str]) -> RunnableLambda:
+        """
+        ``route`` as a runnable for ``batch``/``abatch``: every item goes through _invoke_route, so it
+        gets the retries, backoff and key cooling of a single call and only fails once all keys have.
+        """
+        return RunnableLambda(
+            functools.partial(self._invoke_route, runnables, route),
+            afunc=functools.partial(self._ainvoke_route, runnables, route),
+        )
+
+    @staticmethod
+    def _absorb_batch(pending: List[int], outs: list, results: list, last_error, parse):
+        """Store ``parse(i, out)`` into ``results``; return indices that still need a provider."""
+        failed = []
+        for i, res in zip(pending, outs):
+            try:
+                if isinstance(res, Exception):
+                    raise res
+                results[i] = parse(i, res)
+            except Exception as e:
+                last_error = e
+                failed.append(i)
+        return failed, last_error
+
+    def _throttle_delay(self, api_key: str, runnable, payload: dict) -> float:
+        limiters = self._limiters.get(api_key)
+        if limiters is None:
+            return 0.0
+        rpm, tpm = limiters
+        return max(rpm.reserve(), tpm.reserve(_request_tokens(runnable, payload)))
+
+    def _throttle(self, api_key: str, runnable, payload: dict) -> None:
+        """Block until ``api_key`` has request and token budget for ``runnable`` on ``payload``."""
+        time.sleep(self._throttle_delay(api_key, runnable, payload))
+
+    async def _athrottle(self, api_key: str, runnable, payload: dict) -> None:
+        """Async twin of _throttle."""
+        await asyncio.sleep(self._throttle_delay(api_key, runnable, payload))
 
     # -------- write email (plain text only) --------
+    @staticmethod
+    def _email_payload(job: dict, links: List[str]) -> dict:
+        return {"link_list": "\n".join(links) or "(none)", "job_description": str(job)}
+
     def write_mail(self, job: dict, links: List[str]) -> str:
         # tone/cta may be passed inside job, but we generate plain text regardless.
-        prompt_email = PromptTemplate.from_template(
-            """### JOB DESCRIPTION:
-{job_description}
+        key = (_job_digest(job), tuple(links))
+        reused = self._reuse_email(key, job, links)
+        if reused is not None:
+            return reused
 
-### INSTRUCTION:
-You are Mohan, BDE at AtliQ (AI & Software Consulting).
-Write a SHORT, well-structured PLAIN TEXT cold email (no markdown, no hashtags, no asterisks).
-Include:
-- Subject line (single concise line starting with "Subject:")
-- Greeting
-- One-paragraph intro about AtliQ and why we’re relevant to this job
-- A specific value proposition referencing the role/requirements
-- A clear call to action to schedule a quick call
-- Polite sign-off with name and title
+        res = self._run_with_fallback(
+            self._email_chains, self._routes_by_size(str(job)), self._email_payload(job, links)
+        )
+        return self._remember_email(key, job, links, res)
+
+    async def awrite_mail(self, job: dict, links: List[str]) -> str:
+        key = (_job_digest(job), tuple(links))
+        reused = self._reuse_email(key, job, links)
+        if reused is not None:
+            return reused
 
-Return ONLY clean plain text."""
+        res = await self._arun_with_fallback(
+            self._email_chains, self._routes_by_size(str(job)), self._email_payload(job, links)
         )
+        return self._remember_email(key, job, links, res)
 
-        attempts: list[tuple[str, str, str]] = []
-        if self.heavy_key:
-            attempts.append(("groq", self.heavy_key, self.heavy_model))
-        if self.fast_key:
-            attempts.append(("groq", self.fast_key, self.fast_model))
-        if self.gemini_key and _HAS_GEMINI:
-            attempts.append(("gemini", self.gemini_key, self.gemini_model))
+    def write_mails_batch(
+        self, jobs: List[dict], links: List[List[str]] | None = None, max_concurrency: int = 8
+    ) -> List[str]:
+        """Write several emails with one ``batch`` call per route; cache hits skip the LLM."""
+        links = links or [[] for _ in jobs]
+        keys = [(_job_digest(j), tuple(l)) for j, l in zip(jobs, links)]
+        results: list = [self._reuse_email(k, j, l) for k, j, l in zip(keys, jobs, links)]
+        pending = [i for i, r in enumerate(results) if r is None]
+        last_error = None
+        for route in self._routes_by_size(max((str(jobs[i]) for i in pending), key=len, default="")):
+            if not pending:
+                break
+            outs = self._route_runner(self._email_chains, route).batch(
+                [self._email_payload(jobs[i], links[i]) for i in pending],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+            pending, last_error = self._absorb_batch(
+                pending, outs, results, last_error,
+                lambda i, res: self._remember_email(keys[i], jobs[i], links[i], res),
+            )
+        if pending:
+            raise last_error or RuntimeError("Email writing failed on all providers.")
+        return results
+
+    def write_mail_stream(self, job: dict, links: List[str]) -> Iterator[str]:
+        """
+        Yield the email as it is generated (for ``st.write_stream``); cache hits yield once.
+        Falls back to the next route/key only if a stream fails before its first chunk.
+        """
+        key = (_job_digest(job), tuple(links))
+        reused = self._reuse_email(key, job, links)
+        if reused is not None:
+            yield reused
+            return
 
+        payload = self._email_payload(job, links)
         last_error = None
-        for provider, api_key, model in attempts:
+        for route in self._routes_by_size(str(job)):
+            parts: list[str] = []
             try:
-                llm = _make_groq_llm(api_key, model) if provider == "groq" else _make_gemini_llm(api_key, model)
-                chain_email = prompt_email | llm
-                res = _invoke_with_retry(chain_email, {"job_description": str(job)}, retries=1)
-                return getattr(res, "content", str(res))
+                for chunk in self._stream_route(self._email_chains, route, payload):
+                    text = getattr(chunk, "content", str(chunk))
+                    if text:
+                        parts.append(text)
+                        yield text
             except Exception as e:
+                if parts:
+                    raise
                 last_error = e
                 continue
+            self._remember_email(key, job, links, "".join(parts))
+            return
 
         raise last_error or RuntimeError("Email writing failed on all providers.")
+
+    def _stream_route(self, runnables: dict, route: tuple[str, str], payload) -> Iterator:
+        """Streaming twin of _invoke_route; keys are only switched before the first chunk."""
+        pool = self._pools[route]
+        tried: set[str] = set()
+        last_error = None
+        while True:
+            key = pool.acquire(exclude=tried)
+            if key is None:
+                raise last_error or RuntimeError(f"All API keys for {route[1]} are cooling down.")
+            tried.add(key)
+            others_left = len(tried) < len(pool)
+            runnable = runnables[(*route, key)]
+            started = False
+            try:
+                self._throttle(key, runnable, payload)
+                for chunk in _stream_with_retry(runnable, payload, fail_fast_on_rate_limit=others_left):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not _is_rate_limit(e):
+                    raise
+                pool.cool(key, _retry_after(e) or KEY_COOLDOWN_SEC)
+                last_error = e
+
+    def _reuse_email(self, key: tuple, job: dict, links: List[str]) -> str | None:
+        """Exact cache → semantic near-duplicate → learned role template, in that order."""
+        cached = self._email_cache.get(key)
+        if cached is not None:
+            return cached
+        for name, lookup in (("semantic", self._semantic_lookup), ("gencache", self._gencache_render)):
+            email = lookup(job, links)
+            self._reuse_stats[name][email is None] += 1
+            if email is not None:
+                self._email_cache.put(key, email)
+                return email
+        return None
+
+    def cache_stats(self) -> dict[str, tuple[int, int]]:
+        """(hits, misses) per reuse layer, for the app's diagnostics panel."""
+        return {
+            "extract (exact)": (self._extract_cache.hits, self._extract_cache.misses),
+            "email (exact)": (self._email_cache.hits, self._email_cache.misses),
+            **{f"email ({name})": tuple(hm) for name, hm in self._reuse_stats.items()},
+        }
+
+    def _remember_email(self, key: tuple, job: dict, links: List[str], res) -> str:
+        email = getattr(res, "content", str(res))
+        self._email_cache.put(key, email)
+        self._semantic_store(job, links, email)
+        self._gencache_record(job, email)
+        return email
+
+    # -------- semantic email cache --------
+    @staticmethod
+    def _semantic_doc(job: dict) -> tuple[str, dict]:
+        """Text to embed (job content only) and the tone/cta filter it must match."""
+        prefs = {"tone": str(job.get("tone", "")), "cta": str(job.get("cta", ""))}
+        body = {k: v for k, v in job.items() if k not in prefs}
+        return str(body)[:SEMANTIC_DOC_CHARS], prefs
+
+    def _semantic_lookup(self, job: dict, links: List[str]) -> str | None:
+        """Reuse the email of a near-duplicate job (same tone/cta, cosine distance < threshold)."""
+        if self._sem_cache is None:
+            return None
+        doc, prefs = self._semantic_doc(job)
+        try:
+            res = self._sem_cache.query(
+                query_texts=[doc],
+                n_results=1,
+                where={"$and": [{"tone": prefs["tone"]}, {"cta": prefs["cta"]}]},
+            )
+        except Exception:
+            return None
+        distances = res["distances"][0] if res.get("distances") else []
+        if not distances or distances[0] >= SEMANTIC_MAX_DISTANCE:
+            return None
+        meta = res["metadatas"][0][0]
+        old_links = json.loads(meta["links"])
+        if len(old_links) != len(links):
+            return None
+        return _swap_links(meta["email"], old_links, links)
+
+    def _semantic_store(self, job: dict, links: List[str], email: str) -> None:
+        if self._sem_cache is None:
+            return
+        doc, prefs = self._semantic_doc(job)
+        doc_id = _sha256(doc + json.dumps(prefs, sort_keys=True))
+        try:
+            self._sem_cache.upsert(
+                ids=[doc_id],
+                documents=[doc],
+                metadatas=[{**prefs, "email": email, "links": json.dumps(list(links))}],
+            )
+        except Exception:
+            return
+        with self._sem_lock:
+            if doc_id in self._sem_ids:
+                return
+            self._sem_ids.append(doc_id)
+            evict = [self._sem_ids.popleft() for _ in range(len(self._sem_ids) - SEMANTIC_MAX_ENTRIES)]
+        if evict:
+            try:
+                self._sem_cache.delete(ids=evict)
+            except Exception:
+                pass
+
+    # -------- templated email reuse (GenCache) --------
+    def _gencache_render(self, job: dict, links: List[str]) -> str | None:
+        template = self._gencache.get(_role_cluster(job))
+        if template is None:
+            return None
+        try:
+            return template.render(**_template_context(job, links)).strip()
+        except Exception:
+            return None
+
+    def _gencache_record(self, job: dict, email: str) -> None:
+        """Collect LLM emails per cluster; once enough exist, learn a template in the background."""
+        if self._jinja is None:
+            return
+        cluster = _role_cluster(job)
+        if not cluster[0]:
+            return
+        with self._gencache_lock:
+            if cluster in self._gencache:
+                return
+            samples = self._gencache_samples.setdefault(cluster, [])
+            samples.append(email)
+            if len(samples) < GENCACHE_MIN_SAMPLES:
+                return
+            del self._gencache_samples[cluster]
+            self._gencache[cluster] = None  # reserve: no duplicate learning while in flight
+        threading.Thread(target=self._gencache_learn, args=(cluster, samples), daemon=True).start()
+
+    def _gencache_learn(self, cluster: tuple, samples: List[str]) -> None:
+        examples = "\n\n---\n\n".join(samples)
+        try:
+            template = self._run_with_fallback(
+                self._template_chains, self._large_routes, {"examples": examples}, self._compile_template
+            )
+        except Exception:
+            return
+        self._gencache[cluster] = template
+
+    def _compile_template(self, res):
+        template = self._jinja.from_string(getattr(res, "content", str(res)).strip())
+        probe = template.render(role="Engineer", skills="Python", links="https://example.com")
+        if not probe.lstrip().startswith("Subject:"):
+            raise ValueError("Learned email template does not start with a subject line.")
+        return template
@@ -1,39 +1,80 @@
 # main.py
-import math
+import functools
+import hashlib
+import json
+import os
 import re
-from html import escape
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from html import escape
+from pathlib import Path
+from string import Template
+from types import SimpleNamespace
 from typing import Any, List
 
+import httpx
 import streamlit as st
-import streamlit.components.v1 as components
-from langchain_community.document_loaders import WebBaseLoader
-
-from html import escape
-from chains import Chain
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# Optional fast HTML parser (falls back to BeautifulSoup)
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+    _HAS_SELECTOLAX = True
+except Exception:
+    HTMLParser = None
+    _HAS_SELECTOLAX = False
+
+# Optional HTTP/2 for page fetches (httpx needs the h2 package for it)
+try:
+    import h2  # type: ignore  # noqa: F401
+    _HAS_HTTP2 = True
+except Exception:
+    _HAS_HTTP2 = False
+
+from chains import Chain, enable_llm_cache
 from portfolio import Portfolio
-from utils import clean_text
+from utils import clean_text, to_plain_text
 
 # --------------------- PAGE CONFIG ---------------------
 st.set_page_config(page_title="Cold Email Generator", page_icon="📧", layout="wide")
 
 # --------------------- ONE-TIME STATE ---------------------
-if "chain" not in st.session_state:
-    st.session_state["chain"] = Chain()
-
-if "portfolio" not in st.session_state:
-    csv_path = "my_portfolio.csv"  # repo root
-    st.session_state["portfolio"] = Portfolio(csv_path=csv_path)
-    with st.spinner("📚 Loading your portfolio…"):
-        st.session_state["portfolio"].load_portfolio()
+# Shared by every session in this process: LLM clients, key pools and caches are built once.
+@st.cache_resource(show_spinner=False)
+def get_chain() -> Chain:
+    enable_llm_cache()
+    return Chain()
+
+@st.cache_resource(show_spinner="📚 Loading your portfolio…")
+def get_portfolio(csv_path: str = "my_portfolio.csv") -> Portfolio:  # repo root
+    p = Portfolio(csv_path=csv_path)
+    p.load_portfolio()
+    return p
+
+chain: Chain = get_chain()
+portfolio: Portfolio = get_portfolio()
+if not st.session_state.get("portfolio_loaded"):
+    st.session_state["portfolio_loaded"] = True
     st.toast("Portfolio loaded", icon="📁")
 
-chain: Chain = st.session_state["chain"]
-portfolio: Portfolio = st.session_state["portfolio"]
+# ---- THEME COLORS (fallbacks) ----
+# Theme options only change with the config file, so read them once per process.
+@st.cache_resource(show_spinner=False)
+def _theme() -> SimpleNamespace:
+    dark = (st.get_option("theme.base") or "dark").lower() == "dark"
+    return SimpleNamespace(
+        BORDER="rgba(255,255,255,.15)" if dark else "rgba(0,0,0,.12)",
+        EMAIL_BG="#181a1f" if dark else "#F4F5F8",
+        EMAIL_HOVER="#1e2026" if dark else "#ECEEF3",
+    )
+
+T = _theme()
 
 # --------------------- STYLES (base + responsive) ---------------------
-st.markdown(
-    """
+_CSS_TEMPLATE = Template("""
 <style>
 .block-container{max-width:1200px;padding-top:3.75rem;padding-bottom:3rem;overflow:visible}
 @keyframes pulseGradient{0%{background-position:0% 50%}50%{background-position:100% 50%}100%{background-position:0% 50%}}
@@ -43,47 +84,28 @@ st.markdown(
 .hero-title{font-size:3rem;font-weight:800;line-height:1.12;background:linear-gradient(90deg,#00c6ff,#7b61ff,#ff6ec7);-webkit-background-clip:text;-webkit-text-fill-color:transparent;background-size:220% 220%;animation:pulseGradient 8s ease infinite;white-space:nowrap}
 .hero-sub{text-align:center;font-size:1.12rem;color:#cfcfcf;margin:0 0 1.6rem}
 .card{background:rgba(255,255,255,.05);border:1px solid rgba(255,255,255,.08);border-radius:18px;padding:1.2rem 1.4rem;box-shadow:0 12px 30px rgba(0,0,0,.25);backdrop-filter:blur(8px)}
-.chip{display:inline-block;padding:.3rem .65rem;margin:.18rem .3rem .18rem 0;border-radius:999px;border:1px solid rgba(255,255,255,.15);font-size:.85rem}
-.badge{display:inline-block;padding:.25rem .55rem;border-radius:8px;background:rgba(255,255,255,.1);border:1px solid rgba(255,255,255,.15);font-size:.8rem;margin-left:.35rem;vertical-align:middle}
+.chip{display:inline-block;padding:.3rem .65rem;margin:.18rem .3rem .18rem 0;border-radius:999px;border:1px solid ${BORDER};font-size:.85rem}
+.badge{display:inline-block;padding:.25rem .55rem;border-radius:8px;background:rgba(255,255,255,.1);border:1px solid ${BORDER};font-size:.8rem;margin-left:.35rem;vertical-align:middle}
+.muted{opacity:.7;font-size:.9rem;margin:0}
 hr{border:none;height:1px;background:linear-gradient(90deg,transparent,rgba(255,255,255,.2),transparent)}
 .stTextInput > div > div > input{height:3rem;font-size:1rem}
 pre, pre code { white-space: pre-wrap !important; word-break: break-word !important }
 
 /* EMAIL VIEWER */
-.plain-email{
+[class*="st-key-email_wrap_"]{
   margin-top:.35rem;
   margin-bottom:.2rem;
 }
 .emailbox{
-  background:#181a1f;  /* slightly lighter than full black (#0b0b0b) */
-  border:1px solid rgba(255,255,255,.10);
+  background:${EMAIL_BG};  /* slightly lighter than the page background */
+  border:1px solid ${BORDER};
   border-radius:14px;
   padding:14px 16px 16px;
   transition:background .25s ease;
 }
 .emailbox:hover{
-  background:#1e2026;  /* subtle hover effect */
-}
-.emailbox-toolbar{
-  display:flex;
-  justify-content:flex-end;
-  margin-bottom:6px;
-}
-.copy-btn{
-  border:1px solid rgba(255,255,255,.18);
-  background:rgba(255,255,255,.07);
-  color:inherit;
-  padding:.35rem .7rem;
-  border-radius:8px;
-  cursor:pointer;
-  font-size:.9rem;
-  transition:all .2s ease;
+  background:${EMAIL_HOVER};  /* subtle hover effect */
 }
-.copy-btn:hover{
-  background:rgba(255,255,255,.12);
-}
-.copy-btn:active{ transform:translateY(1px) }
-
 .email-text{
   white-space:pre-wrap;
   word-break:break-word;
@@ -96,12 +118,6 @@ div[data-testid="stDownloadButton"]{
   margin-top:1px !important;
 }
 
-@media (max-width:600px){
-  .emailbox{ padding:13px; }
-  .email-text{ font-size:.98rem; line-height:1.55; }
-  div[data-testid="stDownloadButton"]{ margin-top:4px !important; }
-}
-
 /* RESPONSIVE */
 @media (max-width: 900px){
   .block-container{max-width:100%;padding-top:2.9rem;padding-left:1rem;padding-right:1rem}
@@ -128,27 +144,26 @@ div[data-testid="stDownloadButton"]{
   section.main .stColumns { flex-direction: column !important; gap: .75rem !important }
   .stButton > button, .stDownloadButton > button { width:100% !important }
   .emailbox{ font-size:.98rem; line-height:1.5; padding:15px 13px; }
+  .email-text{ font-size:.98rem; line-height:1.55; }
+  div[data-testid="stDownloadButton"]{ margin-top:4px !important; }
 }
 </style>
-""",
-    unsafe_allow_html=True,
-)
+""")
 
-# ---- THEME COLORS (fallbacks) ----
-BASE = (st.get_option("theme.base") or "dark").lower()
-THEME_BG  = st.get_option("theme.backgroundColor") or ("#0E1117" if BASE == "dark" else "#FFFFFF")
-THEME_TX  = st.get_option("theme.textColor")       or ("#FAFAFA" if BASE == "dark" else "#0B0B0B")
-THEME_SEC = st.get_option("theme.secondaryBackgroundColor") or ("#262730" if BASE == "dark" else "#F0F2F6")
-BORDER_RG = "rgba(255,255,255,.15)" if BASE == "dark" else "rgba(0,0,0,.12)"
-BTN_BG    = "rgba(255,255,255,.08)" if BASE == "dark" else "rgba(0,0,0,.05)"
-AREA_BG   = "rgba(255,255,255,.03)" if BASE == "dark" else "rgba(0,0,0,.02)"
-
-# ---- Email box knobs (customize here) ----
-EMAIL_BOX_DESKTOP_HEIGHT = 300   # Medium box height on desktop
-EMAIL_BOX_RADIUS         = 12    # Border radius of the email container
-EMAIL_FONT_SIZE_DESKTOP  = "0.92rem"
-EMAIL_FONT_SIZE_MOBILE   = "0.98rem"
-EMAIL_LINE_HEIGHT        = "1.5" # Line-height both views
+@st.cache_resource(show_spinner=False)
+def _css_block(border: str, email_bg: str, email_hover: str) -> str:
+    """Stylesheet with the theme colors filled in; built once per theme."""
+    return _CSS_TEMPLATE.substitute(BORDER=border, EMAIL_BG=email_bg, EMAIL_HOVER=email_hover)
+
+def _inject_css() -> None:
+    # Streamlit drops elements a rerun doesn't re-emit, so the sheet is sent every run
+    # (caching the call would only replay it); only the string building is cached.
+    st.markdown(_css_block(T.BORDER, T.EMAIL_BG, T.EMAIL_HOVER), unsafe_allow_html=True)
+
+_inject_css()
+
+# ---- Email preview knobs (customize here) ----
+STREAM_REPAINT_SEC = 0.1  # min gap between streaming preview repaints
 
 
 # --------------------- SIDEBAR ---------------------
@@ -162,6 +177,10 @@ with st.sidebar:
 
     tone_choice = st.selectbox("🎭 Email Tone", TONES, index=TONES.index("Confident"))
     cta_choice = st.selectbox("📢 Call-to-Action", CTAS, index=CTAS.index("Request an Interview"))
+    max_workers = st.slider(
+        "⚡ Parallel requests", 1, 8, 4,
+        help="Concurrent LLM calls when a page lists several jobs. Lower it if you hit rate limits.",
+    )
 
     st.divider()
     st.caption("Quick Example URLs")
@@ -177,168 +196,206 @@ with st.sidebar:
             st.toast(f"Loaded preset: {preset_choice}", icon="✅")
 
 # --------------------- HELPERS ---------------------
-URL_RE = re.compile(r"^https?://", re.IGNORECASE)
-
-def to_plain_text(s: str) -> str:
-    s = re.sub(r"```.*?```", "", s, flags=re.S)
-    s = re.sub(r"`([^`]*)`", r"\1", s)
-    s = re.sub(r"!\[.*?\]\(.*?\)", "", s)
-    s = re.sub(r"\[(.*?)\]\((.*?)\)", r"\1", s)
-    s = re.sub(r"[*_]{1,3}([^*_]+)[*_]{1,3}", r"\1", s)
-    s = re.sub(r"^\s{0,3}#{1,6}\s*", "", s, flags=re.M)
-    s = re.sub(r"^\s{0,3}>\s*", "", s, flags=re.M)
-    s = re.sub(r"^\s*[-*_]{3,}\s*$", "", s, flags=re.M)
-    s = re.sub(r"^\s*[-*•+]\s+", "", s, flags=re.M)
-    s = re.sub(r"\n{3,}", "\n\n", s)
-    return s.strip()
-
-@st.cache_data(ttl=900, show_spinner=False)
+# Hit/miss counters for the app-level caches, shared like the caches themselves
+class _CacheStats:
+    """name -> [hits, misses]; bumped from concurrent sessions, so every access takes the lock."""
+
+    def __init__(self):
+        self._counts = defaultdict(lambda: [0, 0])
+        self._lock = threading.Lock()
+
+    def record(self, name: str, hit: bool) -> None:
+        with self._lock:
+            self._counts[name][0 if hit else 1] += 1
+
+    def items(self) -> list:
+        with self._lock:
+            return [(name, tuple(hm)) for name, hm in self._counts.items()]
+
+@st.cache_resource(show_spinner=False)
+def _cache_stats() -> _CacheStats:
+    return _CacheStats()
+
+# Per-thread flag: did the cached call in flight on this thread run its body (a miss)?
+_CACHE_CALL = threading.local()
+
+def tracked_cache(name: str, **cache_kw):
+    """st.cache_data that also counts hits / misses under `name` for the sidebar panel."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def on_miss(*args, **kwargs):
+            _CACHE_CALL.missed = True
+            return fn(*args, **kwargs)
+        cached = st.cache_data(**cache_kw)(on_miss)
+
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            _CACHE_CALL.missed = False
+            try:
+                return cached(*args, **kwargs)
+            finally:
+                _cache_stats().record(name, hit=not _CACHE_CALL.missed)
+        return call
+    return deco
+
+URL_RE = re.compile(r"^https?://[^\s]+$", re.IGNORECASE)  # no embedded whitespace
+
+# Element-content escaping in one C-level pass (no quotes needed outside attributes)
+_HTML_ESCAPE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+def escape_text(s: str) -> str:
+    return s.translate(_HTML_ESCAPE_TABLE)
+
+FETCH_TIMEOUT_SEC = 10
+FETCH_HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; ColdEmailGenerator/1.0)"}
+_NON_CONTENT_TAGS = ("script", "style", "noscript")
+
+def _html_to_text(html: str) -> str:
+    if _HAS_SELECTOLAX:
+        tree = HTMLParser(html)
+        tree.strip_tags(list(_NON_CONTENT_TAGS))
+        root = tree.body or tree.root
+        return root.text(separator=" ") if root is not None else ""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(_NON_CONTENT_TAGS):
+        tag.decompose()
+    return soup.get_text(" ")
+
+# Disk layer under st.cache_data: survives restarts and is shared by every worker on the host
+PAGE_CACHE_DIR = Path(os.getenv("PAGE_CACHE_DIR", ".cache/pages"))
+PAGE_CACHE_TTL_SEC = 6 * 3600
+
+def _page_cache_path(url: str) -> Path:
+    # Scheme and host are case-insensitive; path and query are not, so only the former are normalized
+    key = str(httpx.URL(url.strip()))
+    return PAGE_CACHE_DIR / f"{hashlib.sha256(key.encode()).hexdigest()}.txt"
+
+def _page_cache_get(url: str) -> str | None:
+    path = _page_cache_path(url)
+    try:
+        if time.time() - path.stat().st_mtime > PAGE_CACHE_TTL_SEC:
+            return None
+        return path.read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+def _page_cache_put(url: str, text: str) -> None:
+    path = _page_cache_path(url)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)  # atomic: readers never see a half-written file
+    except OSError:
+        pass  # cache is best-effort
+
+@st.cache_resource(show_spinner=False)
+def _http_client() -> httpx.Client:
+    """One pooled client per process: keep-alive (and HTTP/2 when available) across fetches."""
+    return httpx.Client(
+        http2=_HAS_HTTP2,
+        headers=FETCH_HEADERS,
+        timeout=FETCH_TIMEOUT_SEC,
+        follow_redirects=True,
+    )
+
+@tracked_cache("fetch", ttl=900, show_spinner=False)
 def fetch_and_clean(url: str) -> str:
-    doc = WebBaseLoader(url).load()[0]
-    return clean_text(doc.page_content)
+    cached = _page_cache_get(url)
+    if cached is not None:
+        return cached
+    r = _http_client().get(url)
+    r.raise_for_status()
+    ctype = r.headers.get("content-type", "").lower()
+    if ctype and not ctype.startswith(("text/", "application/xhtml")):
+        raise ValueError(f"Expected a web page but got `{ctype.split(';')[0]}`.")
+    text = clean_text(_html_to_text(r.text))
+    _page_cache_put(url, text)
+    return text
+
+# Cheap gate before spending LLM tokens: login walls, 404s and SPA shells are short and lack these words
+JOB_PAGE_MIN_CHARS = 500
+_JOB_KEYWORDS = ("responsibilit", "requirement", "qualification", "skills", "experience")
+
+def looks_like_job_page(text: str) -> bool:
+    if len(text) < JOB_PAGE_MIN_CHARS:
+        return False
+    tl = text.lower()
+    return any(k in tl for k in _JOB_KEYWORDS)
+
+# LLM stages are deterministic for the same input, so repeat clicks skip the round trip.
+# The digest is the cache key; underscore args are passed through unhashed for the miss path.
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+@tracked_cache("extract", ttl=3600, show_spinner=False)
+def _extract_jobs_cached(text_hash: str, _text: str) -> List[dict]:
+    return get_chain().extract_jobs(_text)
+
+@tracked_cache("write_mails", ttl=3600, show_spinner=False)
+def _write_mails_cached(
+    jobs_hash: str, links: List[List[str]], _jobs: List[dict], max_concurrency: int = 8
+) -> List[str]:
+    # links are hashed with the key: a portfolio change must not serve stale emails
+    return get_chain().write_mails_batch(_jobs, links, max_concurrency=max_concurrency)
+
+@st.cache_resource(show_spinner=False)
+def _background_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="mail-batch")
+
+def _submit_with_ctx(fn, *args) -> Future:
+    """Run fn on the shared pool, attached to this script run so st.cache_data works there."""
+    ctx = get_script_run_ctx()
+    def task():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return _background_pool().submit(task)
 
 def normalize_skills(raw: Any) -> List[str]:
     if isinstance(raw, str):
-        return [s.strip() for s in raw.split(",") if s.strip()]
+        return [t for t in (s.strip() for s in raw.split(",")) if t]
     if isinstance(raw, list):
-        return [str(s).strip() for s in raw if str(s).strip()]
+        return [t for t in (str(s).strip() for s in raw) if t]
     return [str(raw)]
 
-def render_skill_chips(skills: List[str]):
-    if not skills:
-        st.caption("No skills parsed.")
-        return
-    chips = " ".join(f"<span class='chip'>{escape(s)}</span>" for s in skills)
-    st.markdown(chips, unsafe_allow_html=True)
-
-def download_name(prefix="email", ext="txt"):
-    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{ext}"
-
-import streamlit.components.v1 as components
-from html import escape
-
-# ---- (optional) tweakable knobs at top of your file ----
-# ---- Optional knobs (upar rakh lo) ----
-EMAIL_BOX_DESKTOP_HEIGHT = 300   # medium desktop look (min visual height)
-EMAIL_FONT_SIZE_DESKTOP  = "0.92rem"
-EMAIL_FONT_SIZE_MOBILE   = "0.98rem"
-EMAIL_LINE_HEIGHT        = 1.5   # CSS line-height
-EMAIL_LINE_PX_DESKTOP    = 22    # px approx (estimate only)
-EMAIL_LINE_PX_MOBILE     = 26    # px approx (estimate only)
-
-import math
-import streamlit.components.v1 as components
-from html import escape
-
-def _estimate_iframe_height_for(text: str) -> int:
-    # Rough lines on desktop & mobile, pick the larger to avoid cut on phone
-    wrap_d = 90   # ~chars per line desktop
-    wrap_m = 38   # ~chars per line narrow phones
-    lines_d = 0
-    lines_m = 0
-    for raw in text.splitlines() or [""]:
-        L = max(1, len(raw))
-        lines_d += max(1, math.ceil(L / wrap_d))
-        lines_m += max(1, math.ceil(L / wrap_m))
-    est_d = 140 + lines_d * EMAIL_LINE_PX_DESKTOP   # padding + lines
-    est_m = 160 + lines_m * EMAIL_LINE_PX_MOBILE    # padding + lines
-    est   = max(est_d, est_m)
-    # Add a tiny bottom buffer so first paint pe bhi overlap na ho
-    est  += 40
-    # Clamp: at least desktop min, at most 4000
-    return max(EMAIL_BOX_DESKTOP_HEIGHT + 80, min(est, 4000))
-from html import escape
-import streamlit as st
-
-from html import escape
-import streamlit as st
-
-from html import escape
-import streamlit as st
-
-from html import escape
-import streamlit as st
-
-from html import escape
-import streamlit as st
-from textwrap import dedent
-
-from html import escape
-import streamlit as st
-from textwrap import dedent
-
-from html import escape
-import streamlit as st
-from textwrap import dedent
-
-from html import escape
-import streamlit as st
+_CHIP_HTML = "<span class='chip'>{}</span>"
 
-from html import escape
-import streamlit as st
-from textwrap import dedent
+def skill_chips_html(skills: List[str]) -> str:
+    if not skills:
+        return "<p class='muted'>No skills parsed.</p>"
+    # "Python" and "python" from different sections of a posting render as one chip
+    seen: set[str] = set()
+    uniq = [s for s in skills if not (s.lower() in seen or seen.add(s.lower()))]
+    return " ".join(map(_CHIP_HTML.format, map(escape_text, uniq)))
+
+def badges_html(tone: str, cta: str) -> str:
+    return f"<span class='badge'>{escape(tone)}</span><span class='badge'>{escape(cta)}</span>"
+
+def render_job_card(i: int, role: str, desc: str, exp: str, skills: List[str], badges: str) -> None:
+    """Header + summary card as one markdown element instead of one per field."""
+    st.markdown(
+        f"<h3>#{i} — {escape(role)} {badges}</h3>"
+        f"<div class='card'>"
+        f"<h4>Summary</h4><p>{escape(desc)}</p>"
+        f"<p><strong>Experience:</strong> {escape(exp)}</p>"
+        f"<h4>Skills</h4><div>{skill_chips_html(skills)}</div>"
+        f"</div>",
+        unsafe_allow_html=True,
+    )
+
+def download_name(stamp: str, idx: int | None = None, prefix="email", ext="txt"):
+    # Same stamp for every email of one run; the index keeps the files apart
+    suffix = f"_{idx}" if idx is not None else ""
+    return f"{prefix}_{stamp}{suffix}.{ext}"
 
 def render_plain_email(idx: int, text: str) -> None:
-    """Smooth dark-gray email box with working Copy → Copied! animation."""
-    html = f"""\
-<div class="plain-email" id="email_wrap_{idx}">
-  <div class="emailbox">
-    <div class="emailbox-toolbar">
-      <button class="copy-btn" id="copy_btn_{idx}" type="button">Copy</button>
-    </div>
-    <div id="email_text_{idx}" class="email-text">{escape(text)}</div>
-  </div>
-</div>
-
-<script>
-(function() {{
-  const btn = document.getElementById("copy_btn_{idx}");
-  const txtDiv = document.getElementById("email_text_{idx}");
-  if (!btn || !txtDiv) return;
-
-  btn.addEventListener("click", async (e) => {{
-    e.preventDefault();
-    e.stopPropagation();
-    const old = btn.innerText;
-    btn.disabled = true;
-
-    try {{
-      const text = txtDiv.innerText.trim();
-      if (navigator.clipboard && window.isSecureContext) {{
-        await navigator.clipboard.writeText(text);
-      }} else {{
-        const ta = document.createElement('textarea');
-        ta.value = text;
-        ta.style.position = 'fixed';
-        ta.style.top = '-9999px';
-        document.body.appendChild(ta);
-        ta.focus({{preventScroll:true}});
-        ta.select();
-        document.execCommand('copy');
-        document.body.removeChild(ta);
-      }}
-      btn.innerText = "Copied!";
-      setTimeout(() => {{
-        btn.innerText = old;
-        btn.disabled = false;
-      }}, 1000);
-    }} catch(err) {{
-      console.error("Copy failed", err);
-      btn.innerText = "Error";
-      setTimeout(() => {{
-        btn.innerText = old;
-        btn.disabled = false;
-      }}, 1000);
-    }}
-  }});
-}})();
-</script>
-"""
-    st.markdown(dedent(html), unsafe_allow_html=True)
+    """Native code block: built-in Copy button, no per-email HTML/JS to mount."""
+    with st.container(key=f"email_wrap_{idx}"):
+        st.code(text, language=None, wrap_lines=True)
 
 # --------------------- HERO ---------------------
-st.markdown(
-    """
+_HERO_HTML = """
     <div class="hero-wrap">
       <div class="hero-logo" aria-label="Email logo">
         <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" role="img" aria-hidden="true">
@@ -348,9 +405,8 @@ st.markdown(
       <div class="hero-title">Cold Email Generator</div>
     </div>
     <div class="hero-sub">Turn job posts into tailored, portfolio-backed cold emails instantly.</div>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+st.markdown(_HERO_HTML, unsafe_allow_html=True)
 
 col1, col2 = st.columns([3, 1])
 with col1:
@@ -361,48 +417,71 @@ with col2:
 
 # --------------------- MAIN ---------------------
 if generate:
-    if not url_input.strip() or not URL_RE.match(url_input.strip()):
+    url = url_input.strip()
+    if not (url[:8].lower().startswith(("http://", "https://")) and URL_RE.fullmatch(url)):
         st.error("Please enter a valid `http(s)://` URL.")
     else:
         try:
             with st.spinner("🔎 Fetching & cleaning page…"):
-                text = fetch_and_clean(url_input.strip())
+                text = fetch_and_clean(url)
 
-            with st.spinner("🧠 Extracting job details…"):
-                jobs = chain.extract_jobs(text)
-
-            if not jobs:
-                st.warning("No jobs detected. Try a specific job detail URL.")
+            if not looks_like_job_page(text):
+                st.warning("This page doesn't look like a job posting. Try a specific job detail URL.")
+                jobs = []
             else:
-                st.success(f"✅ Found {len(jobs)} job posting(s).")
-
-            for i, job in enumerate(jobs, start=1):
-                role = job.get("role", "Software Engineer")
-                desc = job.get("description", "")
-                exp = job.get("experience", "N/A")
+                with st.spinner("🧠 Extracting job details…"):
+                    jobs = _extract_jobs_cached(_digest(text), text)
+
+                if not jobs:
+                    st.warning("No jobs detected. Try a specific job detail URL.")
+                else:
+                    st.success(f"✅ Found {len(jobs)} job posting(s).")
+
+            jobs_with_prefs = [{**job, "tone": tone_choice, "cta": cta_choice} for job in jobs]
+            # One portfolio query for the whole page rather than one per job
+            job_links = portfolio.query_links_batch([normalize_skills(j.get("skills", [])) for j in jobs])
+            # Job #1 streams in the foreground while the rest are written as one batch in the background
+            rest, rest_links = jobs_with_prefs[1:], job_links[1:]
+            rest_future = None
+            if rest:
+                rest_hash = _digest(json.dumps(rest, sort_keys=True))
+                rest_future = _submit_with_ctx(_write_mails_cached, rest_hash, rest_links, rest, max_workers)
+            rest_md: List[str] | None = None
+
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            badges = badges_html(tone_choice, cta_choice)  # same for every job in this run
+            for i, (job, job_with_prefs) in enumerate(zip(jobs, jobs_with_prefs), start=1):
+                role = job.get("role") or "Software Engineer"
+                desc = str(job.get("description", ""))
+                exp = str(job.get("experience") or "N/A")
                 skills = normalize_skills(job.get("skills", []))
 
-                # Header with badges
-                st.markdown(
-                    f"### #{i} — {escape(role)} "
-                    f"<span class='badge'>{escape(tone_choice)}</span>"
-                    f"<span class='badge'>{escape(cta_choice)}</span>",
-                    unsafe_allow_html=True,
-                )
-
-                # Job summary card
-                st.markdown("<div class='card'>", unsafe_allow_html=True)
-                st.subheader("Summary", anchor=False)
-                st.write(desc)
-                st.markdown(f"**Experience:** {escape(str(exp))}")
-                st.subheader("Skills", anchor=False)
-                render_skill_chips(skills)
-                st.markdown("</div>", unsafe_allow_html=True)
-
-                # Ask LLM to write (plain text)
-                job_with_prefs = {**job, "tone": tone_choice, "cta": cta_choice}
-                with st.spinner("✍️ Writing tailored email…"):
-                    email_md = chain.write_mail(job_with_prefs, [])
+                # Header with badges + job summary card
+                render_job_card(i, role, desc, exp, skills, badges)
+
+                # First job: stream it so the first tokens show up right away
+                if i == 1:
+                    preview = st.empty()
+                    parts: List[str] = []
+                    next_paint = 0.0
+                    for chunk in chain.write_mail_stream(job_with_prefs, job_links[0]):
+                        parts.append(chunk)
+                        # Repaint at a fixed cadence, not per token: each paint re-sends the whole text
+                        now = time.monotonic()
+                        if now >= next_paint:
+                            next_paint = now + STREAM_REPAINT_SEC
+                            preview.markdown(
+                                f"<div class='emailbox'><div class='email-text'>"
+                                f"{escape_text(to_plain_text(''.join(parts)))}</div></div>",
+                                unsafe_allow_html=True,
+                            )
+                    preview.empty()
+                    email_md = "".join(parts)
+                else:
+                    if rest_md is None:
+                        with st.spinner(f"✍️ Writing {len(rest)} more tailored email(s)…"):
+                            rest_md = rest_future.result()
+                    email_md = rest_md[i - 2]
 
                 email_txt = to_plain_text(email_md)
                 render_plain_email(i, email_txt)
@@ -410,7 +489,7 @@ if generate:
                 st.download_button(
                     label="⬇️ Download Email (.txt)",
                     data=email_txt,
-                    file_name=download_name(ext="txt"),
+                    file_name=download_name(stamp, i, ext="txt"),
                     mime="text/plain",
                     use_container_width=True,
                     key=f"download_email_{i}",
@@ -427,3 +506,16 @@ if generate:
                 )
             else:
                 st.error(f"⚠️ An error occurred: {e}")
+
+# --------------------- DIAGNOSTICS ---------------------
+# Rendered last so the counters include this run's calls
+def _fmt_stats(name: str, hits: int, misses: int) -> str:
+    total = hits + misses
+    rate = f" ({hits / total:.0%})" if total else ""
+    return f"`{name}`: {hits} hit / {misses} miss{rate}"
+
+with st.sidebar:
+    with st.expander("🔬 Cache stats"):
+        rows = [_fmt_stats(n, h, m) for n, (h, m) in sorted(_cache_stats().items())]
+        rows += [_fmt_stats(n, h, m) for n, (h, m) in chain.cache_stats().items()]
+        st.markdown("  \n".join(rows))
@@ -1,11 +1,29 @@
 # portfolio.py
+import re
+import uuid
 from pathlib import Path
+from typing import List
+
 import pandas as pd
 
+# Optional vector store (falls back to tech-stack keyword overlap)
+try:
+    import chromadb
+    _HAS_CHROMA = True
+except Exception:
+    chromadb = None
+    _HAS_CHROMA = False
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#.]+")
+
+def _tokens(text: str) -> set[str]:
+    return set(_TOKEN_RE.findall(text.lower()))
+
 class Portfolio:
     def __init__(self, csv_path: str | None = None):
         self.path = self._resolve_path(csv_path)
-        self.data = pd.read_csv(self.path)
+        self.data: pd.DataFrame | None = None  # read on first load_portfolio()
+        self.collection = None
 
     def _resolve_path(self, csv_path: str | None) -> Path:
         if csv_path:  # explicit path from caller
@@ -30,4 +48,48 @@ class Portfolio:
         )
 
     def load_portfolio(self):
+        if self.data is None:
+            self.data = pd.read_csv(self.path)
+            self.collection = self._build_collection(self.data)
         return self.data
+
+    @staticmethod
+    def _build_collection(data: pd.DataFrame):
+        if not _HAS_CHROMA:
+            return None
+        try:
+            collection = chromadb.Client().get_or_create_collection(name=f"portfolio-{uuid.uuid4().hex[:8]}")
+            # One add for the whole CSV: the embedder runs once over every row
+            collection.add(
+                documents=data["Techstack"].astype(str).tolist(),
+                metadatas=[{"links": str(link)} for link in data["Links"]],
+                ids=[str(i) for i in range(len(data))],
+            )
+            return collection
+        except Exception:
+            return None  # e.g. embedding model unavailable offline
+
+    def query_links(self, skills: List[str], k: int = 2) -> List[str]:
+        return self.query_links_batch([skills], k=k)[0]
+
+    def query_links_batch(self, skill_lists: List[List[str]], k: int = 2) -> List[List[str]]:
+        """Top-k portfolio links per job, embedding every job's skills in one query call."""
+        data = self.load_portfolio()
+        texts = [", ".join(skills) for skills in skill_lists]
+        if not texts:
+            return []
+        if self.collection is not None:
+            try:
+                res = self.collection.query(query_texts=texts, n_results=min(k, len(data)))
+                return [[m["links"] for m in metas] for metas in res["metadatas"]]
+            except Exception:
+                pass
+        # Keyword fallback: rank rows by tech-stack token overlap
+        stacks = [_tokens(stack) for stack in data["Techstack"].astype(str)]
+        links = data["Links"].astype(str).tolist()
+        out = []
+        for text in texts:
+            want = _tokens(text)
+            scored = sorted(((len(want & stack), i) for i, stack in enumerate(stacks)), key=lambda t: (-t[0], t[1]))
+            out.append([links[i] for score, i in scored[:k] if score])
+        return out
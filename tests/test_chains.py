@@ -0,0 +1,135 @@
+import json
+import os
+import unittest
+from collections import Counter
+
+os.environ["GROQ_API_KEYS"] = "key-a,key-b"
+
+import httpx  # noqa: E402
+
+import chains  # noqa: E402
+
+_COMPLETION = {
+    "id": "chatcmpl-test",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "llama-3.1-8b-instant",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "Subject: Hi"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+def _completion(content: str) -> dict:
+    return {**_COMPLETION, "choices": [{**_COMPLETION["choices"][0], "message": {"role": "assistant", "content": content}}]}
+
+
+def _event_stream(content: str) -> bytes:
+    chunk = {**_COMPLETION, "object": "chat.completion.chunk", "choices": [
+        {"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": None},
+    ]}
+    return f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode()
+
+
+class _MockGroqTest(unittest.TestCase):
+    """Groq over a MockTransport: the first key seen answers 429, every other key ``self.content``."""
+
+    content = "Subject: Hi"
+
+    def setUp(self):
+        self.requests = Counter()
+        self.limited_key = None
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            key = request.headers["authorization"].removeprefix("Bearer ")
+            self.requests[key] += 1
+            if self.limited_key is None:
+                self.limited_key = key
+            if key == self.limited_key:
+                return httpx.Response(
+                    429,
+                    headers={"retry-after": "1"},
+                    json={"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}},
+                )
+            if json.loads(request.content).get("stream"):
+                return httpx.Response(
+                    200, headers={"content-type": "text/event-stream"}, content=_event_stream(self.content)
+                )
+            return httpx.Response(200, json=_completion(self.content))
+
+        self._orig_client = chains._HTTPX
+        chains._HTTPX = httpx.Client(transport=httpx.MockTransport(handler))
+        self.chain = chains.Chain()
+
+    def tearDown(self):
+        chains._HTTPX.close()
+        chains._HTTPX = self._orig_client
+
+
+class InvokeRouteRateLimitTest(_MockGroqTest):
+    def test_rate_limited_key_gets_one_request_before_the_next_key(self):
+        route = self.chain._small_routes[0]
+        payload = self.chain._email_payload({"role": f"role-{id(self)}"}, [])
+
+        res = self.chain._invoke_route(self.chain._email_chains, route, payload)
+
+        self.assertEqual(res.content, "Subject: Hi")
+        self.assertEqual(self.requests[self.limited_key], 1)
+        self.assertEqual(sum(self.requests.values()), 2)
+
+
+class ExtractJobsBatchRateLimitTest(_MockGroqTest):
+    content = '{"jobs": [{"role": "Data Engineer", "skills": ["Python"]}]}'
+
+    def test_rate_limited_page_is_retried_on_the_next_key(self):
+        pages = [f"Data Engineer posting {n} {id(self)}" for n in range(2)]
+
+        results = self.chain.extract_jobs_batch(pages, max_concurrency=1)
+
+        self.assertEqual([r[0]["role"] for r in results], ["Data Engineer"] * 2)
+        self.assertEqual(self.requests[self.limited_key], 1)
+        self.assertEqual(sum(self.requests.values()), 3)
+
+
+class WriteMailRateLimitTest(_MockGroqTest):
+    def test_rate_limited_email_in_a_batch_is_retried_on_the_next_key(self):
+        jobs = [{"role": f"Data Engineer {id(self)}"}, {"role": f"Frontend Developer {id(self)}"}]
+
+        emails = self.chain.write_mails_batch(jobs, [[], []], max_concurrency=1)
+
+        self.assertEqual(emails, ["Subject: Hi"] * 2)
+        self.assertEqual(self.requests[self.limited_key], 1)
+        self.assertEqual(sum(self.requests.values()), 3)
+
+    def test_rate_limited_stream_cools_its_key(self):
+        job = {"role": f"Platform Engineer {id(self)}"}
+        route = self.chain._routes_by_size(str(job))[0]
+
+        email = "".join(self.chain.write_mail_stream(job, []))
+
+        self.assertEqual(email, "Subject: Hi")
+        self.assertEqual(self.requests[self.limited_key], 1)
+        self.assertIsNone(self.chain._pools[route].acquire(exclude={k for k in self.requests if k != self.limited_key}))
+
+
+class ThrottleTest(_MockGroqTest):
+    def test_token_cost_covers_rendered_prompt_and_output_cap(self):
+        route = self.chain._small_routes[0]
+        key = self.chain._pools[route].keys[0]
+        payload = self.chain._email_payload({"role": "Data Engineer"}, [])
+
+        cost = chains._request_tokens(self.chain._email_chains[(*route, key)], payload)
+
+        prompt = chains._PROMPT_EMAIL.format(**payload)
+        self.assertEqual(cost, chains._count_tokens(prompt) + chains.EMAIL_MAX_TOKENS)
+
+    def test_budget_makes_callers_wait_once_the_rate_is_spent(self):
+        budget = chains._RateBudget(2, period=60.0)
+
+        waits = [budget.reserve() for _ in range(3)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 30.0, delta=0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
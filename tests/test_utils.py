@@ -0,0 +1,86 @@
+import re
+import unittest
+
+from utils import to_plain_text
+
+
+def _legacy_to_plain_text(s: str) -> str:
+    """The original ten-pass stripper, kept as the reference output."""
+    s = re.sub(r"```.*?```", "", s, flags=re.S)
+    s = re.sub(r"`([^`]*)`", r"\1", s)
+    s = re.sub(r"!\[.*?\]\(.*?\)", "", s)
+    s = re.sub(r"\[(.*?)\]\((.*?)\)", r"\1", s)
+    s = re.sub(r"[*_]{1,3}([^*_]+)[*_]{1,3}", r"\1", s)
+    s = re.sub(r"^\s{0,3}#{1,6}\s*", "", s, flags=re.M)
+    s = re.sub(r"^\s{0,3}>\s*", "", s, flags=re.M)
+    s = re.sub(r"^\s*[-*_]{3,}\s*$", "", s, flags=re.M)
+    s = re.sub(r"^\s*[-*•+]\s+", "", s, flags=re.M)
+    s = re.sub(r"\n{3,}", "\n\n", s)
+    return s.strip()
+
+
+EMAILS = [
+    """Subject: **Scaling your data platform with AtliQ**
+
+Hi Hiring Team,
+
+I'm Mohan, BDE at **AtliQ**. We help teams like yours ship *reliable* Python services.
+
+- **Django & FastAPI** backends in production
+- Data pipelines on *AWS* with [our portfolio](https://example.com/python-portfolio)
+- `pytest`-driven delivery
+
+Would you be open to a **15-minute call** next week?
+
+Best regards,
+Mohan
+BDE, AtliQ""",
+    """## Subject: Senior ML Engineer support
+
+Hello,
+
+> We saw your opening for a Senior ML Engineer.
+
+Our team has delivered:
+- ML pipelines ([case study](https://example.com/ml-python-portfolio))
+- Computer vision models
+
+---
+
+Let me know a good time to talk.
+
+Thanks,
+Mohan""",
+    "Subject: Quick intro\n\nHi team,\n\nPlain text with no markup at all.\n\nBest,\nMohan",
+]
+
+
+class ToPlainTextTest(unittest.TestCase):
+    def test_matches_legacy_output_on_realistic_emails(self):
+        for email in EMAILS:
+            with self.subTest(email=email[:40]):
+                self.assertEqual(to_plain_text(email), _legacy_to_plain_text(email))
+
+    def test_link_inside_emphasis_keeps_only_text(self):
+        self.assertEqual(
+            to_plain_text("Check **[our portfolio](https://atliq.com/p)** today"),
+            "Check our portfolio today",
+        )
+        self.assertEqual(to_plain_text("See **[work](https://a.com/my_page)**"), "See work")
+
+    def test_code_inside_emphasis_drops_backticks(self):
+        self.assertEqual(to_plain_text("*Run `pip install x` first*"), "Run pip install x first")
+
+    def test_asterisk_bullets_lose_their_marker(self):
+        # The legacy passes read "* " as an emphasis opener and left a leading space
+        self.assertEqual(to_plain_text("* ML pipelines\n* Vision models"), "ML pipelines\nVision models")
+
+    def test_bullet_with_bold_and_link_does_not_leak_syntax(self):
+        self.assertEqual(
+            to_plain_text("* **Bold** with [link](u)\n* next *item*"),
+            "Bold with link\nnext item",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
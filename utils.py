@@ -1,16 +1,57 @@
 import re
 
+_TAG_RE = re.compile(r'<[^>]*?>')
+_URL_RE = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+_SPECIAL_RE = re.compile(r'[^a-zA-Z0-9 ]')
+_MULTISPACE_RE = re.compile(r'\s{2,}')
+
 def clean_text(text):
     # Remove HTML tags
-    text = re.sub(r'<[^>]*?>', '', text)
+    text = _TAG_RE.sub('', text)
     # Remove URLs
-    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
+    text = _URL_RE.sub('', text)
     # Remove special characters
-    text = re.sub(r'[^a-zA-Z0-9 ]', '', text)
+    text = _SPECIAL_RE.sub('', text)
     # Replace multiple spaces with a single space
-    text = re.sub(r'\s{2,}', ' ', text)
+    text = _MULTISPACE_RE.sub(' ', text)
     # Trim leading and trailing whitespace
     text = text.strip()
     # Remove extra whitespace
     text = ' '.join(text.split())
-    return text
\ No newline at end of file
+    return text
+
+# Markdown → plain text in one scan: a single alternation, dispatched on the matched group.
+# Line-anchored markers come first so a "* " bullet is never read as an emphasis opener.
+_MD_RE = re.compile(
+    r"(?P<block>^\s{0,3}#{1,6}\s*"               # headings,
+    r"|^\s{0,3}>\s*"                              # blockquotes,
+    r"|^\s*[-*_]{3,}\s*$"                         # horizontal rules,
+    r"|^\s*[-*•+]\s+)"                            # bullets → drop marker
+    r"|(?P<fence>(?s:```.*?```))"                  # fenced code → drop
+    r"|`(?P<code>[^`]*)`"                         # inline code → keep text
+    r"|(?P<img>!\[.*?\]\(.*?\))"                  # images → drop
+    r"|\[(?P<link>.*?)\]\(.*?\)"                   # links → keep text
+    # bold / italics → keep text; links and code spans may sit inside (their URLs can hold "_")
+    r"|[*_]{1,3}(?P<emph>(?:\[[^\]\n]*\]\([^)\n]*\)|`[^`\n]*`|[^*_\n])+)[*_]{1,3}",
+    re.M,
+)
+# Tail pass: trailing spaces/tabs per line, and runs of blank (or whitespace-only) lines → one blank line
+_WS_TAIL_RE = re.compile(r"[ \t]+$|\n(?:[ \t]*\n){2,}", re.M)
+_KEEP_TEXT = {"code", "link"}
+# Every _MD_RE alternative needs one of these; text without any of them has nothing to strip
+_MD_MARKERS = ("`", "[", "*", "_", "#", ">", "-", "•", "+")
+
+def _md_repl(m):
+    group = m.lastgroup
+    if group == "emph":
+        # Emphasis can wrap links / code, so strip markdown in the kept text too
+        return _MD_RE.sub(_md_repl, m.group("emph"))
+    return m.group(group) if group in _KEEP_TEXT else ""
+
+def _ws_repl(m):
+    return "\n\n" if m.group().startswith("\n") else ""
+
+def to_plain_text(s):
+    if any(c in s for c in _MD_MARKERS):
+        s = _MD_RE.sub(_md_repl, s)
+    return _WS_TAIL_RE.sub(_ws_repl, s).strip()